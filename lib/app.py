@@ -1,47 +1,802 @@
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify, g, Response
 import pymysql
 import bcrypt
 import stripe
+import requests
 from flask_cors import CORS
 import os
+import json
+import math
+import queue
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from concurrency import AdmissionGate, SingleFlight, TokenBucket
+
+# Used to report cold-start-to-ready time (reset per worker in gunicorn.conf.py post_fork)
+PROCESS_STARTED = time.time()
+
+try:
+    import redis  # Optional: fans wallet events out across worker processes
+except ImportError:
+    redis = None
+
+try:
+    import gevent  # Optional: cooperative workers (see gunicorn.conf.py)
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent = None
 # Removed: from dotenv import load_dotenv
 
 # Removed: load_dotenv()
 
-app = Flask(__name__)
-# Enable CORS for Flutter/Web clients
-CORS(app)
+# All routes live on this blueprint; create_app() builds the Flask app
+bp = Blueprint("wallet", __name__, cli_group=None)
 
 # Stripe API Key (Using environment variable is safer in production)
 # Accessing env vars directly now
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY", 
     "your stripe secret key")
 
+# Health checks use a short timeout so a slow Stripe cannot stall worker boot;
+# both clients share one session, so the check still warms the TLS connection
+# that PaymentIntent calls reuse
+STRIPE_HEALTH_TIMEOUT = float(os.environ.get("STRIPE_HEALTH_TIMEOUT", "5"))
+stripe_session = requests.Session()
+stripe.default_http_client = stripe.RequestsClient(session=stripe_session)
+stripe_health_client = stripe.StripeClient(
+    stripe.api_key,
+    max_network_retries=0,
+    http_client=stripe.RequestsClient(timeout=STRIPE_HEALTH_TIMEOUT, session=stripe_session),
+)
+
 # Database configuration (Ensure these match your MySQL setup)
 # Accessing env vars directly now
 DB_HOST = os.environ.get("DB_HOST", "localhost")
 DB_USER = os.environ.get("DB_USER", "root")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "your password")
 DB_NAME = os.environ.get("DB_NAME", "ewallet")
+# Bounds how long warm-up (and any request) can block on an unreachable MySQL
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "5"))
+
+# ---------------- BLOCKING CALLS ----------------
+def run_blocking(fn, *args):
+    """Runs a CPU-bound call (bcrypt) on a real OS thread when under gevent.
+
+    Otherwise a login would stall every greenlet in the worker, including
+    open /events streams and money requests.
+    """
+    if gevent is not None and gevent_monkey.is_module_patched("threading"):
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
 
 # ---------------- DB CONNECTION ----------------
-def db():
-    """Establishes a connection to the MySQL database."""
-    try:
+# Each worker process keeps a small pool of idle connections so requests do
+# not pay a MySQL handshake; warm_up() fills it before traffic is accepted.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_IDLE_PING_SECONDS = 30
+
+
+class PooledConnection:
+    """Wraps a pymysql connection so close() hands it back to the pool."""
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+        self._released = False
+        self.last_used = time.monotonic()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    def __init__(self, size):
+        self.size = size
+        self.pid = os.getpid()
+        self.idle = queue.LifoQueue()
+
+    def _connect(self, read_timeout=None):
         return pymysql.connect(
             host=DB_HOST,
             user=DB_USER,
             password=DB_PASSWORD,
             database=DB_NAME,
-            cursorclass=pymysql.cursors.DictCursor
+            cursorclass=pymysql.cursors.DictCursor,
+            connect_timeout=DB_CONNECT_TIMEOUT,
+            read_timeout=read_timeout
         )
+
+    def probe(self):
+        """SELECT 1 on a throwaway connection whose handshake and reads are time-bounded.
+
+        Pooled connections have no read timeout (long queries are fine), so a
+        server that accepts TCP but never answers would stall a pooled connect.
+        """
+        try:
+            conn = self._connect(read_timeout=DB_CONNECT_TIMEOUT)
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            finally:
+                conn.close()
+            return "ok"
+        except Exception as e:
+            return f"error: {e}"
+
+    def acquire(self):
+        if self.pid != os.getpid():
+            # Inherited across fork: never share sockets with the parent
+            self.pid = os.getpid()
+            self.idle = queue.LifoQueue()
+        while True:
+            try:
+                pooled = self.idle.get_nowait()
+            except queue.Empty:
+                return PooledConnection(self._connect(), self)
+            try:
+                if time.monotonic() - pooled.last_used > DB_IDLE_PING_SECONDS:
+                    pooled._conn.ping(reconnect=True)
+            except Exception:
+                self._discard(pooled)
+                continue
+            pooled._released = False
+            return pooled
+
+    def release(self, pooled):
+        try:
+            # End any open read snapshot before reuse
+            pooled._conn.rollback()
+        except Exception:
+            self._discard(pooled)
+            return
+        if self.pid != os.getpid() or self.idle.qsize() >= self.size:
+            self._discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        self.idle.put(pooled)
+
+    def _discard(self, pooled):
+        try:
+            pooled._conn.close()
+        except Exception:
+            pass
+
+    def warm(self):
+        conns = []
+        try:
+            for _ in range(self.size):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+pool = ConnectionPool(DB_POOL_SIZE)
+
+
+def db():
+    """Checks out a MySQL connection from this worker's pool (close() returns it)."""
+    try:
+        return pool.acquire()
     except Exception as e:
         print(f"FATAL DB CONNECTION ERROR: {e}")
         raise e
 
+# ---------------- ADMISSION CONTROL ----------------
+# Every endpoint class gets its own concurrency limit so a flood of logins
+# (bcrypt) or history reads (joins) cannot starve money movement. Requests
+# that would wait longer than the class latency target are shed with 503,
+# and money endpoints are additionally rate limited per user with 429.
+#
+# Limits and buckets are per worker process: with N gunicorn workers a user
+# can make N x MONEY_RATE_PER_SEC money requests per second.
+MONEY_RATE_PER_SEC = float(os.environ.get("MONEY_RATE_PER_SEC", "1"))
+MONEY_BURST = float(os.environ.get("MONEY_BURST", "5"))
+
+# Requests one worker serves at once (gunicorn.conf.py sets this to `threads`
+# for gthread). Non-money classes together get at most half of it, so money
+# requests always find a free slot instead of waiting in the accept queue.
+WORKER_SLOTS = int(os.environ.get("WORKER_SLOTS", "8"))
+
+
+def slots(fraction):
+    return max(1, int(WORKER_SLOTS * fraction))
+
+
+ADMISSION_LIMITS = {
+    # class: (max concurrent, max queued, max queue wait in seconds)
+    "money": (int(os.environ.get("ADMIT_MONEY_CONCURRENCY", slots(1 / 2))), slots(2), 2.0),
+    "stripe": (int(os.environ.get("ADMIT_STRIPE_CONCURRENCY", slots(1 / 8))), slots(1 / 4), 1.0),
+    "auth": (int(os.environ.get("ADMIT_AUTH_CONCURRENCY", slots(1 / 8))), slots(1 / 4), 0.5),
+    "read": (int(os.environ.get("ADMIT_READ_CONCURRENCY", slots(1 / 4))), slots(1 / 2), 0.25),
+}
+
+# Flask endpoint name -> admission class (unlisted endpoints are not gated)
+ENDPOINT_CLASSES = {
+    "register": "auth",
+    "login": "auth",
+    "update_user": "auth",
+    "get_user": "read",
+    "get_transactions": "read",
+    "get_user_transactions": "read",
+    "get_spending_analytics": "read",
+    "create_payment_intent": "stripe",
+    "payment_success": "money",
+    "send_money": "money",
+    "bank_transfer": "money",
+    "college_payment": "money",
+    "mobile_topup": "money",
+    "bill_payment": "money",
+    "shopping_payment": "money",
+}
+
+# Read endpoints served through coalesced(), which takes the read slot itself
+COALESCED_ENDPOINTS = {"get_user", "get_user_transactions"}
+
+
+admission_gates = {
+    name: AdmissionGate(*limits) for name, limits in ADMISSION_LIMITS.items()
+}
+user_buckets = {}
+user_buckets_lock = threading.Lock()
+
+
+def take_user_token(user_id):
+    """Per-user token bucket for money endpoints; returns seconds to wait (0 = allowed)."""
+    with user_buckets_lock:
+        if len(user_buckets) > 10000:
+            # Forget users whose bucket has fully refilled
+            for key in [k for k, b in user_buckets.items() if b.is_full()]:
+                del user_buckets[key]
+        bucket = user_buckets.get(user_id)
+        if bucket is None:
+            bucket = user_buckets[user_id] = TokenBucket(MONEY_RATE_PER_SEC, MONEY_BURST)
+        return bucket.take()
+
+
+@bp.before_app_request
+def admit_request():
+    if request.method == "OPTIONS":
+        return None
+    endpoint = (request.endpoint or "").rpartition(".")[2]
+    endpoint_class = ENDPOINT_CLASSES.get(endpoint)
+    if endpoint_class is None or endpoint in COALESCED_ENDPOINTS:
+        return None
+
+    if endpoint_class == "money":
+        data = request.get_json(silent=True) or {}
+        user_id = data.get("sender_id") or data.get("user_id")
+        if user_id:
+            wait = take_user_token(str(user_id))
+            if wait:
+                print(f"⚠️  Rate limited user {user_id} on {request.endpoint}")
+                return jsonify({"error": "Too many requests, please slow down"}), 429, \
+                    {"Retry-After": str(math.ceil(wait))}
+
+    gate = admission_gates[endpoint_class]
+    if not gate.acquire():
+        return shed_request(gate, endpoint_class)
+    g.admission_gate = gate
+    return None
+
+
+def shed_request(gate, endpoint_class):
+    print(f"⚠️  Shedding {request.endpoint} ({endpoint_class} class overloaded)")
+    return jsonify({"error": "Server busy, please retry"}), 503, \
+        {"Retry-After": str(math.ceil(gate.max_wait))}
+
+
+@bp.teardown_app_request
+def release_admission(exc):
+    gate = g.pop("admission_gate", None)
+    if gate is not None:
+        gate.release()
+
+# ---------------- READ COALESCING ----------------
+# Identical concurrent reads (several devices, duplicate refreshes after a
+# push) share one in-flight DB query and serialized response body.
+# How long a coalesced request waits on another request's query before giving up
+COALESCE_WAIT = float(os.environ.get("COALESCE_WAIT", "5"))
+
+reads_in_flight = SingleFlight()
+
+# Bumped whenever a user's balance, history or profile changes. It is part of
+# the coalescing key, so a read never joins a query that began before the change.
+# Fixed size: users share a counter slot (user_id % N), which only costs an
+# occasional missed coalesce, never a stale read, and memory stays bounded.
+READ_VERSION_SLOTS = 4096
+read_versions = [0] * READ_VERSION_SLOTS
+read_versions_lock = threading.Lock()
+
+
+def read_version(user_id):
+    return read_versions[user_id % READ_VERSION_SLOTS]
+
+
+def mark_user_changed(user_id):
+    with read_versions_lock:
+        read_versions[user_id % READ_VERSION_SLOTS] += 1
+
+
+def coalesced(kind, user_id, loader):
+    """Serves loader()'s (response, status) once for all concurrent identical reads.
+
+    Only the request that runs the query takes a "read" admission slot;
+    requests joining it wait without holding one.
+    """
+    def run():
+        gate = admission_gates["read"]
+        if not gate.acquire():
+            resp, status, headers = shed_request(gate, "read")
+            return resp.get_data(), status, headers
+        try:
+            resp, status = loader()
+        finally:
+            gate.release()
+        return resp.get_data(), status, {}
+
+    version = read_version(user_id)
+    try:
+        body, status, headers = reads_in_flight.do((kind, user_id, version), run, timeout=COALESCE_WAIT)
+    except TimeoutError:
+        print(f"⚠️  Gave up waiting on in-flight {kind} read for user {user_id}")
+        return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
+    return Response(body, status=status, headers=headers, mimetype="application/json")
+
+# ---------------- SPEND ROLLUPS ----------------
+def rollup_transaction(cur, transaction_id, sign=1):
+    """Adds (or with sign=-1 removes) a transaction's spend in spend_daily_rollups.
+
+    Must run on the same cursor/transaction as the insert (or refund) it
+    mirrors so the rollups commit atomically with the ledger.
+    """
+    cur.execute(
+        """
+        INSERT INTO spend_daily_rollups (user_id, day, type, total, tx_count)
+        SELECT sender_id, DATE(created_at), type, amount * %s, %s
+        FROM transactions
+        WHERE id=%s AND sender_id IS NOT NULL
+        ON DUPLICATE KEY UPDATE
+            total = total + VALUES(total),
+            tx_count = tx_count + VALUES(tx_count)
+        """,
+        (sign, sign, transaction_id)
+    )
+
+
+@bp.cli.command("backfill-rollups")
+def backfill_rollups():
+    """Rebuilds spend_daily_rollups from the transactions table."""
+    conn = db()
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM spend_daily_rollups")
+        cur.execute("""
+            INSERT INTO spend_daily_rollups (user_id, day, type, total, tx_count)
+            SELECT sender_id, DATE(created_at), type, SUM(amount), COUNT(*)
+            FROM transactions
+            WHERE sender_id IS NOT NULL AND status NOT IN ('failed', 'cancelled')
+            GROUP BY sender_id, DATE(created_at), type
+        """)
+        rows = cur.rowcount
+        conn.commit()
+        print(f"✅ Backfilled {rows} rollup rows")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Rollup backfill error: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+# ---------------- WALLET EVENTS (PUB/SUB) ----------------
+# Balance and transaction updates are pushed to clients over SSE instead of
+# having every open screen poll. Each connection is a small queue, so under
+# the default gevent worker (gunicorn.conf.py) idle streams cost no OS thread.
+# With REDIS_URL set, events go through Redis so every worker sees them.
+REDIS_URL = os.environ.get("REDIS_URL")
+SSE_KEEPALIVE = float(os.environ.get("SSE_KEEPALIVE", "15"))
+SSE_QUEUE_SIZE = 100
+
+
+class EventBroker:
+    """Per-user fan-out of server-sent events, optionally relayed through Redis."""
+
+    channel_prefix = "wallet-events:"
+
+    def __init__(self, redis_url=None):
+        self.redis_url = redis_url if redis is not None else None
+        self.redis_client = None
+        self.listener = None
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        q = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self.lock:
+            queues = self.subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(q)
+                if not queues:
+                    del self.subscribers[user_id]
+
+    def publish(self, user_id, event, data):
+        message = f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        if self.redis_url:
+            self._ensure_listener()
+            self.redis_client.publish(f"{self.channel_prefix}{user_id}", message)
+        else:
+            self.fanout(user_id, message)
+
+    def fanout(self, user_id, message):
+        with self.lock:
+            queues = list(self.subscribers.get(user_id, ()))
+        for q in queues:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # Slow consumer; it will resync from the REST endpoints
+                pass
+
+    def _ensure_listener(self):
+        # Started lazily so each forked worker gets its own Redis connection
+        if not self.redis_url or self.listener is not None:
+            return
+        with self.lock:
+            if self.listener is not None:
+                return
+            self.redis_client = redis.Redis.from_url(self.redis_url)
+            self.listener = threading.Thread(target=self._listen, name="event-listener", daemon=True)
+            self.listener.start()
+
+    def _listen(self):
+        # Reconnect with backoff; on anything unexpected, clear the listener
+        # so the next subscribe/publish starts a fresh one
+        backoff = 1
+        try:
+            while True:
+                pubsub = None
+                try:
+                    pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.psubscribe(f"{self.channel_prefix}*")
+                    for item in pubsub.listen():
+                        backoff = 1
+                        self._relay(item)
+                except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+                    print(f"⚠️  Event listener lost Redis ({e}), reconnecting in {backoff}s")
+                finally:
+                    if pubsub is not None:
+                        try:
+                            pubsub.close()
+                        except Exception:
+                            pass
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+        except Exception as e:
+            print(f"❌ Event listener stopped: {e}")
+        finally:
+            with self.lock:
+                self.listener = None
+
+    def _relay(self, item):
+        try:
+            channel = item["channel"].decode()
+            user_id = int(channel[len(self.channel_prefix):])
+            # A write in another worker: don't coalesce onto older queries here
+            mark_user_changed(user_id)
+            self.fanout(user_id, item["data"].decode())
+        except Exception as e:
+            print(f"⚠️  Dropping malformed event on {item.get('channel')}: {e}")
+
+
+broker = EventBroker(REDIS_URL)
+
+
+def publish_wallet_update(cur, transaction):
+    """Pushes new balances and the committed transaction to both parties. Call after commit."""
+    user_ids = [int(u) for u in (transaction["sender_id"], transaction["receiver_id"]) if u]
+    for user_id in user_ids:
+        mark_user_changed(user_id)
+    try:
+        placeholders = ",".join(["%s"] * len(user_ids))
+        cur.execute(f"SELECT id, balance FROM users WHERE id IN ({placeholders})", user_ids)
+        for row in cur.fetchall():
+            broker.publish(row["id"], "balance", {"balance": row["balance"]})
+            broker.publish(row["id"], "transaction", transaction)
+    except Exception as e:
+        # Never fail a committed money movement because a push failed
+        print(f"⚠️  Event publish error: {e}")
+
+# ---------------- ASYNC SETTLEMENT ----------------
+# External payouts (bank, topup, bills, college fees) reserve funds and record
+# a 'pending' transaction inside the request, then settle on a worker pool
+# so request latency does not depend on provider speed.
+SETTLEMENT_WORKERS = int(os.environ.get("SETTLEMENT_WORKERS", "8"))
+FAKE_PROVIDER_DELAY = float(os.environ.get("FAKE_PROVIDER_DELAY", "2"))
+FAKE_PROVIDER_FAILURE_RATE = float(os.environ.get("FAKE_PROVIDER_FAILURE_RATE", "0"))
+# Pending rows untouched for this long are assumed lost (crash, kill) and re-queued;
+# keep it well above the slowest provider call plus queueing time
+SETTLEMENT_STALE_SECONDS = int(os.environ.get("SETTLEMENT_STALE_SECONDS", "300"))
+SETTLEMENT_SWEEP_INTERVAL = float(os.environ.get("SETTLEMENT_SWEEP_INTERVAL", "60"))
+SETTLEMENT_SWEEP_BATCH = 100
+# Running settlements refresh updated_at this often so sweepers leave them alone
+SETTLEMENT_HEARTBEAT_INTERVAL = SETTLEMENT_STALE_SECONDS / 4
+
+
+class SettlementError(Exception):
+    """Raised by a provider adapter when the payout was rejected."""
+
+
+class FakeProvider:
+    """Local stand-in for an external provider: sleeps, then succeeds or fails.
+
+    Provider adapters must make settle() idempotent on transaction_id (e.g.
+    pass it as the provider's idempotency key): after a crash mid-call the
+    sweeper re-runs the settlement and the provider is called again.
+    """
+
+    def __init__(self, name, delay=FAKE_PROVIDER_DELAY, failure_rate=FAKE_PROVIDER_FAILURE_RATE):
+        self.name = name
+        self.delay = delay
+        self.failure_rate = failure_rate
+
+    def settle(self, transaction_id, amount, details):
+        """Returns the provider's reference for the payout or raises SettlementError."""
+        time.sleep(self.delay)
+        if random.random() < self.failure_rate:
+            raise SettlementError(f"{self.name} rejected transaction {transaction_id}")
+        return f"{self.name}-{uuid.uuid4().hex[:16]}"
+
+
+# Transaction type -> provider adapter; swap in real adapters here
+SETTLEMENT_PROVIDERS = {
+    "bank_transfer": FakeProvider("fakebank"),
+    "mobile_topup": FakeProvider("faketopup"),
+    "bill_payment": FakeProvider("fakebiller"),
+    "college_payment": FakeProvider("fakecollege"),
+}
+
+settlement_pool = ThreadPoolExecutor(
+    max_workers=SETTLEMENT_WORKERS, thread_name_prefix="settlement"
+)
+# Transaction ids queued or running in this process, so the sweeper skips them
+settlements_in_flight = set()
+# Transaction id -> lease token for settlements currently calling a provider
+settlement_leases = {}
+settlements_lock = threading.Lock()
+
+# A settlement attempt owns a row by writing a fresh token to
+# metadata.settlement_lease. Claims are guarded on the token the caller last
+# saw, so a job that sat in a queue while another worker re-claimed the row
+# finds its claim updates nothing and never reaches the provider.
+LEASE_PATH = "$.settlement_lease"
+
+
+def claim_settlement(cur, transaction_id, expected_lease, stale_only=False):
+    """Swaps in a new lease token; returns it, or None if someone else owns the row."""
+    lease = uuid.uuid4().hex
+    sql = f"""
+        UPDATE transactions
+        SET metadata = JSON_SET(COALESCE(metadata, JSON_OBJECT()), '{LEASE_PATH}', %s),
+            updated_at = NOW()
+        WHERE id=%s AND status='pending'
+    """
+    params = [lease, transaction_id]
+    if stale_only:
+        sql += " AND updated_at < NOW() - INTERVAL %s SECOND"
+        params.append(SETTLEMENT_STALE_SECONDS)
+    else:
+        sql += f" AND JSON_UNQUOTE(JSON_EXTRACT(metadata, '{LEASE_PATH}')) <=> %s"
+        params.append(expected_lease)
+    cur.execute(sql, params)
+    return lease if cur.rowcount == 1 else None
+
+
+def settle_transaction(transaction_id, user_id, tx_type, amount, details, lease=None):
+    """Runs on the settlement pool: claims the row, calls the provider and finalizes it."""
+    try:
+        conn = db()
+        cur = conn.cursor()
+        try:
+            lease = claim_settlement(cur, transaction_id, lease)
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+        if lease is None:
+            print(f"⏭️  Skipping settlement #{transaction_id}: already claimed or finished elsewhere")
+            return
+        with settlements_lock:
+            settlement_leases[transaction_id] = lease
+        finalize_settlement(transaction_id, user_id, tx_type, amount, details)
+    except Exception as e:
+        print(f"❌ Settlement error for #{transaction_id}, leaving it for the sweeper: {e}")
+    finally:
+        with settlements_lock:
+            settlements_in_flight.discard(transaction_id)
+            settlement_leases.pop(transaction_id, None)
+
+
+def finalize_settlement(transaction_id, user_id, tx_type, amount, details):
+    provider = SETTLEMENT_PROVIDERS[tx_type]
+    try:
+        reference = provider.settle(transaction_id, amount, details)
+        error = None
+    except Exception as e:
+        reference = None
+        error = e
+
+    conn = db()
+    cur = conn.cursor()
+    try:
+        if error is None:
+            cur.execute(
+                "UPDATE transactions SET status='completed', reference_id=%s WHERE id=%s AND status='pending'",
+                (reference, transaction_id)
+            )
+            updated = cur.rowcount == 1
+            conn.commit()
+            status = "completed"
+            if updated:
+                print(f"✅ Settled {tx_type} #{transaction_id} via {provider.name} ({reference})")
+        else:
+            # Mark failed and refund the reserved funds in one DB transaction
+            cur.execute(
+                "UPDATE transactions SET status='failed' WHERE id=%s AND status='pending'",
+                (transaction_id,)
+            )
+            updated = cur.rowcount == 1
+            if updated:
+                cur.execute("UPDATE users SET balance = balance + %s WHERE id=%s", (amount, user_id))
+                rollup_transaction(cur, transaction_id, sign=-1)
+            conn.commit()
+            status = "failed"
+            if updated:
+                print(f"❌ Settlement failed for {tx_type} #{transaction_id}, refunded ${amount}: {error}")
+        if not updated:
+            # Someone else already finalized the row; report what the DB says
+            cur.execute("SELECT status FROM transactions WHERE id=%s", (transaction_id,))
+            row = cur.fetchone()
+            recorded = row["status"] if row else "missing"
+            if recorded != status:
+                print(
+                    f"❌ RECONCILE {tx_type} #{transaction_id}: provider {provider.name} returned "
+                    f"{status} ({reference or error}) but the row is already {recorded}"
+                )
+            status = recorded
+        publish_wallet_update(cur, {
+            "transaction_id": transaction_id, "sender_id": user_id, "receiver_id": None,
+            "amount": amount, "type": tx_type, "status": status
+        })
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Settlement bookkeeping error for #{transaction_id}: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def enqueue_settlement(transaction_id, user_id, tx_type, amount, details, lease=None):
+    """Queues a committed pending transaction; on failure the sweeper picks it up later.
+
+    `lease` is the token the caller holds on the row (None for a fresh row).
+    """
+    with settlements_lock:
+        if transaction_id in settlements_in_flight:
+            return
+        settlements_in_flight.add(transaction_id)
+    try:
+        settlement_pool.submit(settle_transaction, transaction_id, user_id, tx_type, amount, details, lease)
+    except Exception as e:
+        with settlements_lock:
+            settlements_in_flight.discard(transaction_id)
+        print(f"⚠️  Could not queue settlement #{transaction_id}, leaving it for the sweeper: {e}")
+
+
+def sweep_pending_settlements():
+    """Re-queues pending payouts whose settlement was lost. Returns how many were claimed."""
+    conn = db()
+    cur = conn.cursor()
+    claimed = []
+    try:
+        placeholders = ",".join(["%s"] * len(SETTLEMENT_PROVIDERS))
+        cur.execute(
+            f"""
+            SELECT id, sender_id, type, amount, metadata FROM transactions
+            WHERE status='pending' AND type IN ({placeholders})
+              AND updated_at < NOW() - INTERVAL %s SECOND
+            ORDER BY id
+            LIMIT %s
+            """,
+            (*SETTLEMENT_PROVIDERS, SETTLEMENT_STALE_SECONDS, SETTLEMENT_SWEEP_BATCH)
+        )
+        for row in cur.fetchall():
+            with settlements_lock:
+                if row["id"] in settlements_in_flight:
+                    continue
+            # Only one worker's sweeper wins each stale row
+            lease = claim_settlement(cur, row["id"], None, stale_only=True)
+            conn.commit()
+            if lease is not None:
+                claimed.append((row, lease))
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Settlement sweep error: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+    for row, lease in claimed:
+        details = json.loads(row["metadata"]) if row["metadata"] else {}
+        details.pop("settlement_lease", None)
+        enqueue_settlement(row["id"], row["sender_id"], row["type"], row["amount"], details, lease)
+    if claimed:
+        print(f"🔁 Re-queued {len(claimed)} stale pending settlement(s)")
+    return len(claimed)
+
+
+def run_settlement_sweeper():
+    while not health["draining"]:
+        try:
+            sweep_pending_settlements()
+        except Exception as e:
+            # e.g. MySQL down at boot: keep the sweeper alive for the next round
+            print(f"❌ Settlement sweep error: {e}")
+        time.sleep(SETTLEMENT_SWEEP_INTERVAL)
+
+
+def run_settlement_heartbeat():
+    """Keeps updated_at fresh on rows whose provider call is still running here."""
+    while not health["draining"]:
+        time.sleep(SETTLEMENT_HEARTBEAT_INTERVAL)
+        with settlements_lock:
+            leases = list(settlement_leases.items())
+        if not leases:
+            continue
+        try:
+            conn = db()
+            cur = conn.cursor()
+            try:
+                for transaction_id, lease in leases:
+                    cur.execute(
+                        f"UPDATE transactions SET updated_at=NOW() WHERE id=%s AND status='pending' "
+                        f"AND JSON_UNQUOTE(JSON_EXTRACT(metadata, '{LEASE_PATH}'))=%s",
+                        (transaction_id, lease)
+                    )
+                conn.commit()
+            finally:
+                cur.close()
+                conn.close()
+        except Exception as e:
+            print(f"⚠️  Settlement heartbeat error: {e}")
+
 # ---------------- REGISTER USER ----------------
-@app.route("/register", methods=["POST"])
+@bp.route("/register", methods=["POST"])
 def register():
     data = request.json
     name = data.get("name")
@@ -53,7 +808,7 @@ def register():
     if not name or not email or not password:
         return jsonify({"error": "Missing required fields"}), 400
     
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    hashed_password = run_blocking(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
 
     conn = db()
     cur = conn.cursor()
@@ -91,7 +846,7 @@ def register():
         conn.close()
 
 # ---------------- LOGIN USER ----------------
-@app.route("/login", methods=["POST"])
+@bp.route("/login", methods=["POST"])
 def login():
     data = request.json
     email = data.get("email")
@@ -114,7 +869,7 @@ def login():
         if isinstance(stored_password, str):
             stored_password = stored_password.encode('utf-8')
         
-        if not bcrypt.checkpw(password.encode('utf-8'), stored_password):
+        if not run_blocking(bcrypt.checkpw, password.encode('utf-8'), stored_password):
             return jsonify({"error": "Invalid credentials"}), 401
         
         # Remove password before sending to client
@@ -134,8 +889,12 @@ def login():
         conn.close()
 
 # ---------------- GET USER DATA ----------------
-@app.route("/user/<int:id>")
+@bp.route("/user/<int:id>")
 def get_user(id):
+    return coalesced("user", id, lambda: load_user(id))
+
+
+def load_user(id):
     conn = db()
     cur = conn.cursor()
     try:
@@ -158,7 +917,7 @@ def get_user(id):
         conn.close()
 
 # ---------------- UPDATE USER PROFILE ----------------
-@app.route("/user/<int:id>", methods=["PUT"])
+@bp.route("/user/<int:id>", methods=["PUT"])
 def update_user(id):
     data = request.json
     name = data.get("name")
@@ -194,6 +953,7 @@ def update_user(id):
         sql = f"UPDATE users SET {', '.join(updates)} WHERE id=%s"
         cur.execute(sql, values)
         conn.commit()
+        mark_user_changed(id)
         
         # Fetch updated user, selecting the 'avatar' column
         cur.execute("SELECT id, name, email, phone, avatar, balance FROM users WHERE id=%s", (id,))
@@ -219,7 +979,7 @@ def update_user(id):
         conn.close()
 
 # ---------------- CREATE PAYMENT INTENT (STRIPE) ----------------
-@app.route("/create-payment-intent", methods=["POST"])
+@bp.route("/create-payment-intent", methods=["POST"])
 def create_payment_intent():
     data = request.json
     amount = float(data.get("amount", 0)) 
@@ -241,7 +1001,7 @@ def create_payment_intent():
         return jsonify({"error": str(e)}), 500
 
 # ---------------- PAYMENT SUCCESS (UPDATE BALANCE) ----------------
-@app.route("/payment-success", methods=["POST"])
+@bp.route("/payment-success", methods=["POST"])
 def payment_success():
     data = request.json
     user_id = data.get("user_id")
@@ -261,8 +1021,14 @@ def payment_success():
             "INSERT INTO transactions (sender_id, receiver_id, amount, type) VALUES (%s,%s,%s,'add')",
             (None, user_id, amount)
         )
+        transaction_id = cur.lastrowid
         conn.commit()
         
+        publish_wallet_update(cur, {
+            "transaction_id": transaction_id, "sender_id": None, "receiver_id": user_id,
+            "amount": amount, "type": "add", "status": "completed"
+        })
+        
         # Fetch and return updated user data, selecting the 'avatar' column
         cur.execute("SELECT id, name, email, phone, avatar, balance FROM users WHERE id=%s", (user_id,))
         user = cur.fetchone()
@@ -279,7 +1045,7 @@ def payment_success():
         conn.close()
 
 # ---------------- SEND MONEY (P2P TRANSFER) ----------------
-@app.route("/send", methods=["POST"])
+@bp.route("/send", methods=["POST"])
 def send_money():
     data = request.json
     sender_id = data.get("sender_id")
@@ -318,8 +1084,15 @@ def send_money():
             "INSERT INTO transactions (sender_id, receiver_id, amount, type) VALUES (%s,%s,%s,'send')",
             (sender_id, receiver_id, amount)
         )
+        transaction_id = cur.lastrowid
+        rollup_transaction(cur, transaction_id)
         conn.commit()
         
+        publish_wallet_update(cur, {
+            "transaction_id": transaction_id, "sender_id": int(sender_id), "receiver_id": receiver_id,
+            "amount": amount, "type": "send", "status": "completed"
+        })
+        
         print(f"✅ Money sent: ${amount} from {sender_id} to {receiver_id}")
         
         return jsonify({"message": "Money sent successfully!"}), 200
@@ -332,7 +1105,7 @@ def send_money():
         conn.close()
 
 # ---------------- BANK TRANSFER (WITHDRAWAL) ----------------
-@app.route("/bank-transfer", methods=["POST"])
+@bp.route("/bank-transfer", methods=["POST"])
 def bank_transfer():
     data = request.json
     user_id = data.get("user_id")
@@ -343,6 +1116,8 @@ def bank_transfer():
     if not user_id or not account_number or not bank_name or amount <= 0:
         return jsonify({"error": "Invalid parameters"}), 400
 
+    details = {"account_number": account_number, "bank_name": bank_name}
+
     conn = db()
     cur = conn.cursor()
     try:
@@ -355,19 +1130,33 @@ def bank_transfer():
         if user["balance"] < amount:
             return jsonify({"error": "Insufficient balance"}), 400
 
-        # Debit user's balance
+        # Reserve funds by debiting the user's balance now
         cur.execute("UPDATE users SET balance = balance - %s WHERE id=%s", (amount, user_id))
         
-        # Record transaction (receiver_id is NULL for external transfers)
+        # Record pending transaction (receiver_id is NULL for external transfers)
         cur.execute(
-            "INSERT INTO transactions (sender_id, receiver_id, amount, type) VALUES (%s,%s,%s,'bank_transfer')",
-            (user_id, None, amount)
+            "INSERT INTO transactions (sender_id, receiver_id, amount, type, status, metadata) "
+            "VALUES (%s,%s,%s,'bank_transfer','pending',%s)",
+            (user_id, None, amount, json.dumps(details))
         )
+        transaction_id = cur.lastrowid
+        rollup_transaction(cur, transaction_id)
         conn.commit()
         
-        print(f"✅ Bank transfer: ${amount} withdrawn by user {user_id}")
+        # Hand off to the provider; the worker completes or refunds it
+        enqueue_settlement(transaction_id, user_id, "bank_transfer", amount, details)
+        publish_wallet_update(cur, {
+            "transaction_id": transaction_id, "sender_id": user_id, "receiver_id": None,
+            "amount": amount, "type": "bank_transfer", "status": "pending"
+        })
+        
+        print(f"⏳ Bank transfer #{transaction_id}: ${amount} reserved for user {user_id}")
         
-        return jsonify({"message": f"Bank transfer of ${amount} to {bank_name} successful!"}), 200
+        return jsonify({
+            "message": f"Bank transfer of ${amount} to {bank_name} is being processed",
+            "transaction_id": transaction_id,
+            "status": "pending"
+        }), 202
     except Exception as e:
         conn.rollback()
         print(f"❌ Bank transfer error: {e}")
@@ -377,7 +1166,7 @@ def bank_transfer():
         conn.close()
 
 # ---------------- COLLEGE PAYMENT ----------------
-@app.route("/college-payment", methods=["POST"])
+@bp.route("/college-payment", methods=["POST"])
 def college_payment():
     data = request.json
     user_id = data.get("user_id")
@@ -389,6 +1178,8 @@ def college_payment():
     if not user_id or not student_id or not college_name or amount <= 0:
         return jsonify({"error": "Invalid parameters"}), 400
 
+    details = {"student_id": student_id, "college_name": college_name, "semester": semester}
+
     conn = db()
     cur = conn.cursor()
     try:
@@ -401,19 +1192,33 @@ def college_payment():
         if user["balance"] < amount:
             return jsonify({"error": "Insufficient balance"}), 400
 
-        # Debit user's balance
+        # Reserve funds by debiting the user's balance now
         cur.execute("UPDATE users SET balance = balance - %s WHERE id=%s", (amount, user_id))
         
-        # Record transaction (receiver_id is NULL for external payments)
+        # Record pending transaction (receiver_id is NULL for external payments)
         cur.execute(
-            "INSERT INTO transactions (sender_id, receiver_id, amount, type) VALUES (%s,%s,%s,'college_payment')",
-            (user_id, None, amount)
+            "INSERT INTO transactions (sender_id, receiver_id, amount, type, status, metadata) "
+            "VALUES (%s,%s,%s,'college_payment','pending',%s)",
+            (user_id, None, amount, json.dumps(details))
         )
+        transaction_id = cur.lastrowid
+        rollup_transaction(cur, transaction_id)
         conn.commit()
         
-        print(f"✅ College payment: ${amount} paid by user {user_id} for {college_name}")
+        # Hand off to the provider; the worker completes or refunds it
+        enqueue_settlement(transaction_id, user_id, "college_payment", amount, details)
+        publish_wallet_update(cur, {
+            "transaction_id": transaction_id, "sender_id": user_id, "receiver_id": None,
+            "amount": amount, "type": "college_payment", "status": "pending"
+        })
+        
+        print(f"⏳ College payment #{transaction_id}: ${amount} reserved by user {user_id} for {college_name}")
         
-        return jsonify({"message": f"College payment of ${amount} for {semester} successful!"}), 200
+        return jsonify({
+            "message": f"College payment of ${amount} for {semester} is being processed",
+            "transaction_id": transaction_id,
+            "status": "pending"
+        }), 202
     except Exception as e:
         conn.rollback()
         print(f"❌ College payment error: {e}")
@@ -423,7 +1228,7 @@ def college_payment():
         conn.close()
 
 # ---------------- MOBILE TOPUP ----------------
-@app.route("/mobile-topup", methods=["POST"])
+@bp.route("/mobile-topup", methods=["POST"])
 def mobile_topup():
     data = request.json
     user_id = data.get("user_id")
@@ -434,6 +1239,8 @@ def mobile_topup():
     if not user_id or not phone_number or not operator or amount <= 0:
         return jsonify({"error": "Invalid parameters"}), 400
 
+    details = {"phone_number": phone_number, "operator": operator}
+
     conn = db()
     cur = conn.cursor()
     try:
@@ -446,19 +1253,33 @@ def mobile_topup():
         if user["balance"] < amount:
             return jsonify({"error": "Insufficient balance"}), 400
 
-        # Debit user's balance
+        # Reserve funds by debiting the user's balance now
         cur.execute("UPDATE users SET balance = balance - %s WHERE id=%s", (amount, user_id))
         
-        # Record transaction
+        # Record pending transaction
         cur.execute(
-            "INSERT INTO transactions (sender_id, receiver_id, amount, type) VALUES (%s,%s,%s,'mobile_topup')",
-            (user_id, None, amount)
+            "INSERT INTO transactions (sender_id, receiver_id, amount, type, status, metadata) "
+            "VALUES (%s,%s,%s,'mobile_topup','pending',%s)",
+            (user_id, None, amount, json.dumps(details))
         )
+        transaction_id = cur.lastrowid
+        rollup_transaction(cur, transaction_id)
         conn.commit()
         
-        print(f"✅ Mobile topup: ${amount} to {phone_number} by user {user_id}")
+        # Hand off to the provider; the worker completes or refunds it
+        enqueue_settlement(transaction_id, user_id, "mobile_topup", amount, details)
+        publish_wallet_update(cur, {
+            "transaction_id": transaction_id, "sender_id": user_id, "receiver_id": None,
+            "amount": amount, "type": "mobile_topup", "status": "pending"
+        })
         
-        return jsonify({"message": f"Mobile topup of ${amount} to {phone_number} successful!"}), 200
+        print(f"⏳ Mobile topup #{transaction_id}: ${amount} to {phone_number} reserved by user {user_id}")
+        
+        return jsonify({
+            "message": f"Mobile topup of ${amount} to {phone_number} is being processed",
+            "transaction_id": transaction_id,
+            "status": "pending"
+        }), 202
     except Exception as e:
         conn.rollback()
         print(f"❌ Mobile topup error: {e}")
@@ -469,7 +1290,7 @@ def mobile_topup():
 
 
 # ---------------- BILL PAYMENT ----------------
-@app.route("/bill-payment", methods=["POST"])
+@bp.route("/bill-payment", methods=["POST"])
 def bill_payment():
     data = request.json
     user_id = data.get("user_id")
@@ -480,6 +1301,8 @@ def bill_payment():
     if not user_id or not bill_type or not account_number or amount <= 0:
         return jsonify({"error": "Invalid parameters"}), 400
 
+    details = {"bill_type": bill_type, "account_number": account_number}
+
     conn = db()
     cur = conn.cursor()
     try:
@@ -492,19 +1315,33 @@ def bill_payment():
         if user["balance"] < amount:
             return jsonify({"error": "Insufficient balance"}), 400
 
-        # Debit user's balance
+        # Reserve funds by debiting the user's balance now
         cur.execute("UPDATE users SET balance = balance - %s WHERE id=%s", (amount, user_id))
         
-        # Record transaction
+        # Record pending transaction
         cur.execute(
-            "INSERT INTO transactions (sender_id, receiver_id, amount, type) VALUES (%s,%s,%s,'bill_payment')",
-            (user_id, None, amount)
+            "INSERT INTO transactions (sender_id, receiver_id, amount, type, status, metadata) "
+            "VALUES (%s,%s,%s,'bill_payment','pending',%s)",
+            (user_id, None, amount, json.dumps(details))
         )
+        transaction_id = cur.lastrowid
+        rollup_transaction(cur, transaction_id)
         conn.commit()
         
-        print(f"✅ Bill payment: ${amount} for {bill_type} by user {user_id}")
+        # Hand off to the provider; the worker completes or refunds it
+        enqueue_settlement(transaction_id, user_id, "bill_payment", amount, details)
+        publish_wallet_update(cur, {
+            "transaction_id": transaction_id, "sender_id": user_id, "receiver_id": None,
+            "amount": amount, "type": "bill_payment", "status": "pending"
+        })
+        
+        print(f"⏳ Bill payment #{transaction_id}: ${amount} for {bill_type} reserved by user {user_id}")
         
-        return jsonify({"message": f"{bill_type.capitalize()} bill payment of ${amount} successful!"}), 200
+        return jsonify({
+            "message": f"{bill_type.capitalize()} bill payment of ${amount} is being processed",
+            "transaction_id": transaction_id,
+            "status": "pending"
+        }), 202
     except Exception as e:
         conn.rollback()
         print(f"❌ Bill payment error: {e}")
@@ -514,7 +1351,7 @@ def bill_payment():
         conn.close()
 
 # ---------------- SHOPPING PAYMENT ----------------
-@app.route("/shopping-payment", methods=["POST"])
+@bp.route("/shopping-payment", methods=["POST"])
 def shopping_payment():
     data = request.json
     user_id = data.get("user_id")
@@ -544,8 +1381,15 @@ def shopping_payment():
             "INSERT INTO transactions (sender_id, receiver_id, amount, type) VALUES (%s,%s,%s,'shopping')",
             (user_id, None, amount)
         )
+        transaction_id = cur.lastrowid
+        rollup_transaction(cur, transaction_id)
         conn.commit()
         
+        publish_wallet_update(cur, {
+            "transaction_id": transaction_id, "sender_id": user_id, "receiver_id": None,
+            "amount": amount, "type": "shopping", "status": "completed"
+        })
+        
         print(f"✅ Shopping payment: ${amount} to {merchant_name} by user {user_id}")
         
         return jsonify({"message": f"Payment of ${amount} to {merchant_name} successful!"}), 200
@@ -558,7 +1402,7 @@ def shopping_payment():
         conn.close()
 
 # ---------------- GET ALL TRANSACTIONS ----------------
-@app.route("/transactions")
+@bp.route("/transactions")
 def get_transactions():
     """Fetches all transactions, joining with user names/phones for context."""
     conn = db()
@@ -569,6 +1413,7 @@ def get_transactions():
                 t.id AS transaction_id,
                 t.amount,
                 t.type,
+                t.status,
                 t.created_at,
                 sender.name AS sender_name,
                 sender.phone AS sender_phone,
@@ -590,9 +1435,13 @@ def get_transactions():
         conn.close()
 
 # ---------------- GET TRANSACTIONS BY USER ----------------
-@app.route("/transactions/<int:user_id>")
+@bp.route("/transactions/<int:user_id>")
 def get_user_transactions(user_id):
     """Fetches transactions relevant to a specific user (as sender or receiver)."""
+    return coalesced("user_transactions", user_id, lambda: load_user_transactions(user_id))
+
+
+def load_user_transactions(user_id):
     conn = db()
     cur = conn.cursor()
     try:
@@ -603,6 +1452,7 @@ def get_user_transactions(user_id):
                 t.receiver_id,
                 t.amount,
                 t.type,
+                t.status,
                 t.created_at,
                 sender.name AS sender_name,
                 sender.phone AS sender_phone,
@@ -624,8 +1474,100 @@ def get_user_transactions(user_id):
         cur.close()
         conn.close()
 
+# ---------------- SPENDING ANALYTICS ----------------
+def spend_rows(rows):
+    """Drops fully refunded rows; totals stay Decimal (like balances), counts become ints."""
+    return [
+        dict(row, total=Decimal(row["total"]), count=int(row["count"]))
+        for row in rows if row["count"]
+    ]
+
+
+@bp.route("/analytics/<int:user_id>")
+def get_spending_analytics(user_id):
+    """Spend by type and by day/month, read from spend_daily_rollups.
+
+    Query params: from/to (YYYY-MM-DD, default last 30 days), group=day|month.
+    """
+    group = request.args.get("group", "day")
+    if group not in ("day", "month"):
+        return jsonify({"error": "group must be 'day' or 'month'"}), 400
+    try:
+        end = date.fromisoformat(request.args.get("to", date.today().isoformat()))
+        start = date.fromisoformat(request.args.get("from", (end - timedelta(days=29)).isoformat()))
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+    if start > end:
+        return jsonify({"error": "'from' must not be after 'to'"}), 400
+
+    period = "DATE_FORMAT(day, '%%Y-%%m')" if group == "month" else "DATE_FORMAT(day, '%%Y-%%m-%%d')"
+
+    conn = db()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT type, SUM(total) AS total, SUM(tx_count) AS count
+            FROM spend_daily_rollups
+            WHERE user_id=%s AND day BETWEEN %s AND %s
+            GROUP BY type
+            ORDER BY total DESC
+            """,
+            (user_id, start, end)
+        )
+        by_type = spend_rows(cur.fetchall())
+
+        cur.execute(
+            f"""
+            SELECT {period} AS period, type, SUM(total) AS total, SUM(tx_count) AS count
+            FROM spend_daily_rollups
+            WHERE user_id=%s AND day BETWEEN %s AND %s
+            GROUP BY period, type
+            ORDER BY period, type
+            """,
+            (user_id, start, end)
+        )
+        series = spend_rows(cur.fetchall())
+
+        return jsonify({
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "group": group,
+            "total": sum((row["total"] for row in by_type), Decimal("0")),
+            "by_type": by_type,
+            "series": series,
+        }), 200
+    except Exception as e:
+        print(f"❌ Spending analytics error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# ---------------- WALLET EVENT STREAM (SSE) ----------------
+@bp.route("/events/<int:user_id>")
+def user_events(user_id):
+    """Streams 'balance' and 'transaction' events for a user as server-sent events."""
+    q = broker.subscribe(user_id)
+
+    def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    yield q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            broker.unsubscribe(user_id, q)
+
+    return Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
 # ---------------- TEST DB CONNECTION ----------------
-@app.route("/test-db")
+@bp.route("/test-db")
 def test_db():
     conn = db()
     cur = conn.cursor()
@@ -639,6 +1581,125 @@ def test_db():
         cur.close()
         conn.close()
 
-if __name__ == "__main__":
+# ---------------- HEALTH (LIVENESS / READINESS) ----------------
+# Probes read cached state; dependencies are checked by warm_up() and then
+# by a background refresher, never on the probe itself.
+HEALTH_CHECK_INTERVAL = float(os.environ.get("HEALTH_CHECK_INTERVAL", "5"))
+# Stripe is an external, rate-limited API, so it is re-checked less often
+STRIPE_HEALTH_INTERVAL = float(os.environ.get("STRIPE_HEALTH_INTERVAL", "60"))
+
+health = {
+    "ready": False,
+    "draining": False,
+    "db": None,
+    "stripe": None,
+    "checked_at": None,
+    "stripe_checked_at": None,
+    "warmup_seconds": None,
+    "cold_start_seconds": None,
+}
+
+
+def check_db():
+    try:
+        conn = db()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT 1")
+        finally:
+            cur.close()
+            conn.close()
+        return "ok"
+    except Exception as e:
+        return f"error: {e}"
+
+
+def check_stripe():
+    # Also opens the TLS connection Stripe's client reuses for later calls
+    try:
+        stripe_health_client.v1.balance.retrieve()
+        return "ok"
+    except Exception as e:
+        return f"error: {e}"
+
+
+def refresh_health():
+    while not health["draining"]:
+        time.sleep(HEALTH_CHECK_INTERVAL)
+        health["db"] = check_db()
+        health["checked_at"] = time.time()
+        if time.time() - health["stripe_checked_at"] >= STRIPE_HEALTH_INTERVAL:
+            health["stripe"] = check_stripe()
+            health["stripe_checked_at"] = time.time()
+
+
+def warm_up():
+    """Fills the DB pool and primes Stripe before this worker takes traffic."""
+    started = time.monotonic()
+    # Only fill the pool once MySQL answers, so a hung server costs one
+    # bounded probe instead of a stalled connect per pool slot
+    health["db"] = pool.probe()
+    if health["db"] == "ok":
+        try:
+            pool.warm()
+        except Exception as e:
+            print(f"❌ DB pool warm-up error: {e}")
+    health["stripe"] = check_stripe()
+    health["checked_at"] = health["stripe_checked_at"] = time.time()
+    health["warmup_seconds"] = round(time.monotonic() - started, 3)
+    health["cold_start_seconds"] = round(time.time() - PROCESS_STARTED, 3)
+    health["ready"] = True
+    threading.Thread(target=refresh_health, name="health-refresh", daemon=True).start()
+    threading.Thread(target=run_settlement_sweeper, name="settlement-sweeper", daemon=True).start()
+    threading.Thread(target=run_settlement_heartbeat, name="settlement-heartbeat", daemon=True).start()
+    print(
+        f"🚀 Worker {os.getpid()} ready in {health['cold_start_seconds']}s "
+        f"(warm-up {health['warmup_seconds']}s, db: {health['db']}, stripe: {health['stripe']})"
+    )
 
+
+def begin_drain():
+    """Fails readiness so the load balancer stops routing new requests here."""
+    health["draining"] = True
+
+
+def shutdown():
+    """Drains in-flight settlements and closes pooled connections."""
+    begin_drain()
+    settlement_pool.shutdown(wait=True)
+    pool.close_all()
+    print(f"👋 Worker {os.getpid()} drained")
+
+
+@bp.route("/metrics/coalescing")
+def coalescing_metrics():
+    return jsonify(reads_in_flight.snapshot()), 200
+
+
+@bp.route("/health/live")
+def liveness():
+    return jsonify({"status": "alive"}), 200
+
+
+@bp.route("/health/ready")
+def readiness():
+    # A refresher stuck on a hung DB must not keep serving an old "ok"
+    fresh = health["checked_at"] is not None and time.time() - health["checked_at"] < 3 * HEALTH_CHECK_INTERVAL
+    ready = health["ready"] and not health["draining"] and health["db"] == "ok" and fresh
+    return jsonify(dict(health, status="ready" if ready else "not ready")), 200 if ready else 503
+
+# ---------------- APP FACTORY ----------------
+def create_app():
+    app = Flask(__name__)
+    # Enable CORS for Flutter/Web clients
+    CORS(app)
+    app.register_blueprint(bp)
+    return app
+
+
+# Production: gunicorn -c gunicorn.conf.py (pre-forks workers, see that file)
+app = create_app()
+
+if __name__ == "__main__":
+    warm_up()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,114 @@
+"""Stdlib-only concurrency helpers used by app.py (kept free of Flask/DB imports)."""
+import threading
+import time
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """Returns 0 if a token was taken, otherwise seconds until one is available."""
+        self._refill(self.clock())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self):
+        self._refill(self.clock())
+        return self.tokens >= self.burst
+
+
+class AdmissionGate:
+    """Bounded concurrency with a bounded, time-limited wait queue."""
+
+    def __init__(self, limit, max_queue, max_wait):
+        self.slots = threading.BoundedSemaphore(limit)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.waiting >= self.max_queue:
+                return False
+            self.waiting += 1
+        try:
+            return self.slots.acquire(timeout=self.max_wait)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def release(self):
+        self.slots.release()
+
+
+class SingleFlight:
+    """Runs fn once per key at a time; concurrent callers wait for its result."""
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def do(self, key, fn, timeout=None):
+        """Returns fn()'s result, shared with callers of the same key.
+
+        Callers that join an in-flight call wait at most `timeout` seconds
+        and then raise TimeoutError; the leader's error is re-raised to all.
+        """
+        kind = key[0]
+        with self.lock:
+            stats = self.stats.setdefault(kind, {"requests": 0, "coalesced": 0, "timed_out": 0})
+            stats["requests"] += 1
+            call = self.calls.get(key)
+            if call is not None:
+                stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self.calls[key] = SingleFlight.Call()
+                leader = True
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self.lock:
+                    stats["timed_out"] += 1
+                raise TimeoutError(f"in-flight call for {key!r} still running after {timeout}s")
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                kind: dict(stats, rate=round(stats["coalesced"] / stats["requests"], 4))
+                for kind, stats in self.stats.items()
+            }
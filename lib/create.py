@@ -17,6 +17,7 @@ try:
         # Drop existing tables in correct order (foreign keys)
         print("Dropping existing tables...")
         cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        cursor.execute("DROP TABLE IF EXISTS spend_daily_rollups")
         cursor.execute("DROP TABLE IF EXISTS transactions")
         cursor.execute("DROP TABLE IF EXISTS sessions")
         cursor.execute("DROP TABLE IF EXISTS users")
@@ -97,6 +98,20 @@ try:
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
         """)
         
+        # Create per-user daily spend rollups (maintained by app.py)
+        print("Creating spend_daily_rollups table...")
+        cursor.execute("""
+            CREATE TABLE spend_daily_rollups (
+                user_id INT NOT NULL,
+                day DATE NOT NULL,
+                type VARCHAR(32) NOT NULL,
+                total DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+                tx_count INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day, type),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        
         # Create audit log table
         print("Creating audit_logs table...")
         cursor.execute("""
@@ -129,7 +144,7 @@ try:
             print(f"  ✓ {list(table.values())[0]}")
         
         # Show structures
-        for table_name in ['users', 'sessions', 'transactions', 'audit_logs']:
+        for table_name in ['users', 'sessions', 'transactions', 'spend_daily_rollups', 'audit_logs']:
             print(f"\n📋 {table_name} table structure:")
             cursor.execute(f"DESCRIBE {table_name}")
             for row in cursor.fetchall():
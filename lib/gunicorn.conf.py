@@ -0,0 +1,83 @@
+# Production server settings. Run from lib/:  gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = "app:app"
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# gevent by default so idle /events streams are greenlets, not threads.
+# WORKER_CLASS=gthread also works, but every open stream then holds a thread.
+# WORKER_CLASS is the only switch: it also decides the monkey patching below,
+# so do not pass -k/--worker-class (on_starting refuses a mismatch).
+worker_class = os.environ.get("WORKER_CLASS", "gevent")
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", "1000"))
+threads = int(os.environ.get("THREADS", "8"))
+
+# Sizes app.py's admission limits. Under gthread a slot is a thread. Under
+# gevent the limits bound concurrent DB/CPU work per worker instead.
+os.environ.setdefault("WORKER_SLOTS", str(threads if worker_class == "gthread" else 16))
+
+if worker_class == "gevent":
+    # Patch before preload_app imports app.py, so the locks, semaphores and
+    # queues it creates at import time are cooperative
+    from gevent import monkey
+    monkey.patch_all()
+
+# Import app.py (config, routes) once in the master, then fork workers
+preload_app = True
+
+# Time given to in-flight requests and settlements on SIGTERM
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+
+# Must exceed the worst-case warm_up(): the DB probe (connect plus handshake,
+# DB_CONNECT_TIMEOUT each) plus the Stripe check (STRIPE_HEALTH_TIMEOUT),
+# about 15s by default. Otherwise a slow dependency gets booting workers killed
+# in a loop instead of them coming up with /health/ready reporting 503.
+timeout = int(os.environ.get("TIMEOUT", "60"))
+
+
+def on_starting(server):
+    # -k/--worker-class overrides worker_class after this file already chose
+    # whether to patch, leaving e.g. gthread workers on a gevent-patched stdlib
+    if server.cfg.worker_class_str != worker_class:
+        raise RuntimeError(
+            f"worker class {server.cfg.worker_class_str!r} does not match WORKER_CLASS "
+            f"{worker_class!r}; set WORKER_CLASS instead of passing -k/--worker-class"
+        )
+
+
+def post_fork(server, worker):
+    # With preload_app, app.py was imported in the master (maybe hours ago);
+    # measure this worker's cold start from its own fork
+    import time
+    import app
+    app.PROCESS_STARTED = time.time()
+
+
+def post_worker_init(worker):
+    # Runs in each worker before it starts accepting connections
+    import signal
+    from app import begin_drain, warm_up
+
+    # gunicorn only calls worker_int on SIGINT/SIGQUIT; fail readiness on a
+    # graceful SIGTERM too, then hand over to gunicorn's own handler
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        begin_drain()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    warm_up()
+
+
+def worker_int(worker):
+    from app import begin_drain
+    begin_drain()
+
+
+def worker_exit(server, worker):
+    from app import shutdown
+    shutdown()
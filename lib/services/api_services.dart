@@ -295,7 +295,7 @@ class ApiService {
       _debugPrint('Bank Transfer Status: ${res.statusCode}');
       _debugPrint('Bank Transfer Response: ${res.body}');
 
-      if (res.statusCode == 200) {
+      if (res.statusCode == 200 || res.statusCode == 202) {
         final body = jsonDecode(res.body);
         return {
           'success': true,
@@ -340,7 +340,7 @@ class ApiService {
       _debugPrint('College Payment Status: ${res.statusCode}');
       _debugPrint('College Payment Response: ${res.body}');
 
-      if (res.statusCode == 200) {
+      if (res.statusCode == 200 || res.statusCode == 202) {
         final body = jsonDecode(res.body);
         return {
           'success': true,
@@ -383,7 +383,7 @@ class ApiService {
       _debugPrint('Mobile Topup Status: ${res.statusCode}');
       _debugPrint('Mobile Topup Response: ${res.body}');
 
-      if (res.statusCode == 200) {
+      if (res.statusCode == 200 || res.statusCode == 202) {
         final body = jsonDecode(res.body);
         return {
           'success': true,
@@ -426,7 +426,7 @@ class ApiService {
       _debugPrint('Bill Payment Status: ${res.statusCode}');
       _debugPrint('Bill Payment Response: ${res.body}');
 
-      if (res.statusCode == 200) {
+      if (res.statusCode == 200 || res.statusCode == 202) {
         final body = jsonDecode(res.body);
         return {
           'success': true,
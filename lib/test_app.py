@@ -0,0 +1,155 @@
+"""Checks for app.py pieces that need no MySQL. Run from the repo root: python -m pytest lib"""
+from decimal import Decimal
+
+import pytest
+
+for module in ("flask", "flask_cors", "pymysql", "bcrypt", "stripe"):
+    pytest.importorskip(module)
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def broker():
+    return app.EventBroker()
+
+
+def test_broker_delivers_published_events_to_subscribers(broker):
+    q = broker.subscribe(5)
+    other = broker.subscribe(6)
+    broker.publish(5, "balance", {"balance": 12})
+    assert q.get_nowait() == 'event: balance\ndata: {"balance": 12}\n\n'
+    assert other.empty()
+
+
+def test_broker_drops_events_for_a_full_queue(broker):
+    q = broker.subscribe(5)
+    for i in range(app.SSE_QUEUE_SIZE + 5):
+        broker.publish(5, "transaction", {"n": i})
+    assert q.qsize() == app.SSE_QUEUE_SIZE
+    assert '"n": 0' in q.get_nowait()
+
+
+def test_broker_stops_delivering_after_unsubscribe(broker):
+    q = broker.subscribe(5)
+    broker.unsubscribe(5, q)
+    assert broker.subscribers == {}
+    broker.publish(5, "balance", {"balance": 1})
+    assert q.empty()
+
+
+def test_broker_drops_malformed_relayed_messages(broker):
+    q = broker.subscribe(5)
+    broker._relay({"channel": b"wallet-events:not-a-user", "data": b"event: x\n\n"})
+    broker._relay({"channel": b"wallet-events:5", "data": None})
+    assert q.empty()
+    broker._relay({"channel": b"wallet-events:5", "data": b"event: x\n\n"})
+    assert q.get_nowait() == "event: x\n\n"
+
+
+class FakeCursor:
+    """Records queries and returns canned fetchall() results in order."""
+
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.queries = []
+        self.rowcount = 1
+
+    def execute(self, sql, params=None):
+        self.queries.append((sql, params))
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def close(self):
+        pass
+
+
+def rendered(query):
+    """The SQL as pymysql sends it (params interpolated, %% unescaped)."""
+    sql, params = query
+    return sql % tuple(repr(p) for p in params)
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    def install(results):
+        cur = FakeCursor(results)
+        monkeypatch.setattr(app, "db", lambda: FakeConnection(cur))
+        return cur
+    return install
+
+
+@pytest.mark.parametrize("query", [
+    "group=week",
+    "from=2026-13-01",
+    "to=yesterday",
+    "from=2026-05-02&to=2026-05-01",
+])
+def test_analytics_rejects_bad_parameters_without_querying(client, monkeypatch, query):
+    monkeypatch.setattr(app, "db", lambda: pytest.fail("must not hit the database"))
+    res = client.get(f"/analytics/1?{query}")
+    assert res.status_code == 400
+    assert "error" in res.json
+
+
+def test_analytics_groups_by_month(client, fake_db):
+    cur = fake_db([
+        [{"type": "shopping", "total": Decimal("12.50"), "count": Decimal("2")},
+         {"type": "bill_payment", "total": Decimal("3.00"), "count": Decimal("1")},
+         {"type": "mobile_topup", "total": Decimal("0.00"), "count": Decimal("0")}],
+        [{"period": "2026-05", "type": "shopping", "total": Decimal("12.50"), "count": Decimal("2")}],
+    ])
+    res = client.get("/analytics/1?from=2026-04-01&to=2026-05-31&group=month")
+    assert res.status_code == 200
+    assert "DATE_FORMAT(day, '%Y-%m') AS period" in rendered(cur.queries[1])
+    body = res.json
+    assert body["total"] == "15.50"
+    assert [row["type"] for row in body["by_type"]] == ["shopping", "bill_payment"]
+    assert body["by_type"][0] == {"type": "shopping", "total": "12.50", "count": 2}
+    assert body["series"] == [{"period": "2026-05", "type": "shopping", "total": "12.50", "count": 2}]
+
+
+def test_analytics_day_period_and_empty_total(client, fake_db):
+    cur = fake_db([[], []])
+    res = client.get("/analytics/1?from=2026-05-01&to=2026-05-07")
+    assert "DATE_FORMAT(day, '%Y-%m-%d') AS period" in rendered(cur.queries[1])
+    assert res.json["total"] == "0"
+    assert res.json["by_type"] == [] and res.json["series"] == []
+
+
+def test_rollup_refund_subtracts_amount_and_count():
+    cur = FakeCursor()
+    app.rollup_transaction(cur, 7, sign=-1)
+    sql = rendered(cur.queries[0])
+    assert "amount * -1, -1" in sql
+    assert "WHERE id=7 AND sender_id IS NOT NULL" in sql
+    assert "tx_count = tx_count + VALUES(tx_count)" in sql
+
+
+def test_read_versions_stay_bounded_and_bump_per_user():
+    before = app.read_version(42)
+    neighbour = app.read_version(43)
+    # Users that share slot 43 bump it; user 42's version is untouched
+    for k in range(3):
+        app.mark_user_changed(43 + k * app.READ_VERSION_SLOTS)
+    app.mark_user_changed(42)
+    assert len(app.read_versions) == app.READ_VERSION_SLOTS
+    assert app.read_version(42) == before + 1
+    assert app.read_version(43) == neighbour + 3
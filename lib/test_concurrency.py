@@ -0,0 +1,126 @@
+"""Unit checks for concurrency.py. Run from the repo root: python -m pytest lib"""
+import threading
+import time
+
+import pytest
+
+from concurrency import AdmissionGate, SingleFlight, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_reports_retry_time():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == 0.5
+
+
+def test_bucket_refills_over_time_up_to_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=2, clock=clock)
+    bucket.take()
+    bucket.take()
+    clock.now += 0.25
+    assert bucket.take() == 0.75
+    clock.now += 10
+    assert bucket.is_full()
+    assert [bucket.take() for _ in range(2)] == [0, 0]
+    assert bucket.take() == 1
+
+
+def test_gate_admits_up_to_limit_and_sheds_after_max_wait():
+    gate = AdmissionGate(limit=2, max_queue=4, max_wait=0.05)
+    assert gate.acquire() and gate.acquire()
+    started = time.monotonic()
+    assert not gate.acquire()
+    assert time.monotonic() - started >= 0.05
+    gate.release()
+    assert gate.acquire()
+
+
+def test_gate_sheds_immediately_when_queue_is_full():
+    gate = AdmissionGate(limit=1, max_queue=1, max_wait=1)
+    assert gate.acquire()
+    waiter = threading.Thread(target=gate.acquire)
+    waiter.start()
+    while gate.waiting == 0:
+        time.sleep(0.001)
+    started = time.monotonic()
+    assert not gate.acquire()
+    assert time.monotonic() - started < 0.5
+    gate.release()
+    waiter.join()
+
+
+def run_concurrently(count, target):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_single_flight_shares_one_call_between_concurrent_callers():
+    flight = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return "body"
+
+    results, errors = run_concurrently(8, lambda: flight.do(("user", 1), fn))
+    assert calls == [1]
+    assert results == ["body"] * 8 and not errors
+    assert flight.snapshot()["user"] == {"requests": 8, "coalesced": 7, "timed_out": 0, "rate": 0.875}
+    assert flight.calls == {}
+
+
+def test_single_flight_propagates_leader_error_to_followers():
+    flight = SingleFlight()
+
+    def fn():
+        time.sleep(0.1)
+        raise ValueError("db down")
+
+    results, errors = run_concurrently(4, lambda: flight.do(("user", 1), fn))
+    assert not results
+    assert len(errors) == 4 and all(isinstance(e, ValueError) for e in errors)
+    # A failed call is not cached
+    assert flight.do(("user", 1), lambda: "ok") == "ok"
+
+
+def test_single_flight_followers_give_up_after_timeout():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=(("user", 1), release.wait))
+    leader.start()
+    while not flight.calls:
+        time.sleep(0.001)
+    with pytest.raises(TimeoutError):
+        flight.do(("user", 1), lambda: "unused", timeout=0.05)
+    release.set()
+    leader.join()
+    assert flight.snapshot()["user"]["timed_out"] == 1
+
+
+def test_single_flight_keys_do_not_share():
+    flight = SingleFlight()
+    assert flight.do(("user", 1), lambda: 1) == 1
+    assert flight.do(("user", 2), lambda: 2) == 2